@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+##################
+## Brute force encounter search
+##################
+
+##################
+## Summary:
+##   This module holds the early, brute force version of the encounter search for
+##   hl_enc_v101.py.  It is kept so the results of the better method can be checked
+##   against it (with the -b option), but it is only imported when that option is
+##   given, so the default path doesn't load it.
+##   It only works through an existing HlProcessor object and the user objects it
+##   holds, so it doesn't import the main script.
+##
+##   Usage:  from hl_enc_bruteforce import findEncountersBruteForce
+##           findEncountersBruteForce(processor)
+##################
+
+
+# OPTIONAL AND *OBSOLETE*
+# Void - This is an early version of the function that implements a
+#        brute force approach to finding valid encounters, assuming
+#        everyone is interesting to everyone else and requiring less
+#        saved state and fewer lookup mechanisms (like sets of interesting users).
+#        It looks at entries multiple times, making it very inefficient.
+#        (It also changed as more structures were added to develop the
+#         better version in HlProcessor.findEncounters().)
+def findEncountersBruteForce(processor):
+    user0EntryIdx = 0
+    user0Entry = processor.getDataEntry(user0EntryIdx)
+    while(user0Entry != None):
+        user0 = processor.userList[user0Entry.userId]
+        processor.updateUserStateFromEntry(user0, user0Entry)
+
+        user1EntryIdx = user0EntryIdx + 1
+        user1Entry = processor.getDataEntry(user1EntryIdx)
+        while(user1Entry != None):
+            if(user1Entry.userId == user0Entry.userId):
+                break
+            user1 = processor.userList[user1Entry.userId]
+            processor.updateUserStateFromEntry(user1, user1Entry)
+
+            if(not user0.userIsStillActive(user1Entry.time)):
+                break
+            if(not user0.alreadyEncounteredUserWithinLimit(user1, user1Entry.time)):
+                if(user0.distanceToUserWithinLimit(user1, processor.filterWithApprox)):
+                    processor.addEncounter(user0, user1)
+            user1EntryIdx += 1
+            user1Entry = processor.getDataEntry(user1EntryIdx)
+        user0EntryIdx += 1
+        user0Entry = processor.getDataEntry(user0EntryIdx)
+    # sort encounters by time stamp - using this method, some might be out of order
+    # processor.sortEncounterTimes()
+    processor.sortEncountersCompletely()
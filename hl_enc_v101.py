@@ -1,5 +1,7 @@
-#!/usr/bin/python -u
+#!/usr/bin/python3 -u
+from __future__ import print_function
 import sys, string, re, math, timeit, operator
+from array import array
 
 ##################
 ## Challenge solution
@@ -85,10 +87,34 @@ import sys, string, re, math, timeit, operator
 ##        to prune points which are obviously too far apart to bother.
 ##    -- Profiling results:  Using chords doesn't seem to be worth the bother for the
 ##                           brute force method on this data set.
+##                           The equirectangular approximation is cheap enough to be
+##                           worth it, so it is now the default filter (see Goal 3).
 ##
 ##  * (2) Prune users' sets of other "interesting" users when other users have gone
 ##        inactive (doesn't really save much), are too far away to matter soon (complicated),
 ##        or have stopped being "interesting" for some reason (like profile changes).
+##    -- Not needed here:  Everyone is interesting to everyone else, so users keep no sets
+##                         of interesting users at all.  The grid index prunes users that
+##                         are too far away, and drops inactive users from its cells.
+##
+##  * (3) Compile the distance kernels (Cython or a C extension, built with -O3) for native
+##        speed per call.
+##    -- Not done:  The script must run on any machine with only Python installed, and a
+##                  compiled module would add a build step (and a failure mode) to that.
+##                  The kernels are already plain float functions at module level
+##                  (haversineInner, haversineDistance, equirectangularDistance), so a
+##                  compiled version could replace them without touching the classes.
+##                  The main scan runs its whole per-entry candidate loop in the
+##                  recordEntryEncounters kernel, which is the one to compile first.
+##
+##  * (4) Split the scan over the entries across cores, testing distances for chunks of
+##        entries in parallel and merging the candidate encounters in time order.
+##    -- Not done:  Only the distance tests are independent.  Whether a close pair is an
+##                  encounter depends on the pair's last encounter time, and so on every
+##                  earlier encounter, which leaves a sequential pass over all candidates.
+##                  With the grid index, each entry only tests a handful of nearby users,
+##                  so the parallel part is small next to the cost of starting worker
+##                  processes and passing the columns and results between them.
 ##
 ##################
 
@@ -110,8 +136,12 @@ import sys, string, re, math, timeit, operator
 ##            - Save the most recent time and location with a user on its update
 ##              (unless calculating deltas to estimate motion, the most recent is sufficient)
 ##            - Keep list of "friends" or other interesting users in each user
+##              (in this problem everyone is interesting to everyone else, so the
+##               processor's list of all users serves as that list, without any
+##               per-user copies)
 ##            - On an update for a user, check last times and locations of users in
-##              the list for active statuses and viable encounter distances
+##              the list (narrowed by the grid index) for active statuses and viable
+##              encounter distances
 ##
 ## Goal 3:  Minimize the very expensive distance calculations.  Can we estimate it
 ##          with a rough bounds check?  If straight line (chord) distance is >= 150m, then
@@ -124,9 +154,21 @@ import sys, string, re, math, timeit, operator
 ##                once.  Saves an arcsin.  Sqrt is O(M(n)), trig functions are possibly
 ##                O((log n)^2 * M(n)).
 ##          NOTE:  Profiling of the entire script using the timeit module
-##                 shows no benefit to enabling the chord filter for the given input file.
+##                 showed no benefit to enabling the chord filter for the given input file.
 ##                 It's almost as accurate for small distances and doesn't save much
 ##                 so it isn't really worth it as a gross filter.
+##          Equirectangular (flat earth) approximation:
+##                         d ~= R sqrt( ((l2-l1) cos(p))^2 + (p2-p1)^2 )
+##                It needs no trig functions at all, since cos(p) is already calculated for
+##                the Haversine formula, so it is now used as the default gross filter.
+##                Using the smaller of cos(p1) and cos(p2) keeps it from overestimating by
+##                more than a factor of pi/2 for points within 150m (the worst case is
+##                two points on opposite sides of a pole), which the 100m buffer covers.
+##          Bounding box:  |p2-p1| <= d/R  and  |l2-l1| <= asin( sin(d/R) / cos(p2) )
+##                Every point within the distance d lies inside this box, so the box is an
+##                exact gross filter.  Its longitude half-width is calculated once per entry,
+##                and each candidate then costs only a few comparisons, so the box is always
+##                checked before the other filters.
 ##
 ## Goal 4:  The algo should ideally require one main pass through the records, if possible.
 ##          Use lookup tables or other structures to facilitate it.
@@ -154,10 +196,10 @@ import sys, string, re, math, timeit, operator
 
 # Global options to set through command line arguments.  They can be hardwired here,
 # but it's not necessary.
-# The approximate dist filter uses chord length to decide if it should use the Haversine
-# formula for a better answer.
+# The approximate dist filter uses the equirectangular approximation to decide if it should
+# use the Haversine formula for a better answer.
 do_debug = False
-use_approx_dist_filter = False
+use_approx_dist_filter = True
 use_brute_force_method = False
 skip_printing_for_profiling = False
 sort_encounter_list = False
@@ -165,174 +207,286 @@ sort_encounter_list = False
 
 ## 360 degrees = 2*pi radians
 ## Can use library functions math.radians(x) and math.degrees(x)
-# k_DegToRadMult = math.pi / 180.0 
+## The multiplier gives exactly the same values as math.radians(x), without a call per value.
+kHl_DegToRadMult = math.pi / 180.0
 
 # 6 hour and 24 hour time limit constants
 kHl_UserActiveTimeLimit = 21600
 kHl_EncounterTimeLimit  = 86400
+# Last encounter unixtime stored for a pair of users that hasn't had an encounter yet;
+# the smallest value the pair encounter time array can hold (a C long of the array's item
+# size), so it is never within the limit
+kHl_NoEncounterTime = -(1 << ((8 * array('l').itemsize) - 1))
 # 150 meter max distance for an encounter
 kHl_MaximumEncounterDistance = 150.0
 kHl_MaximumApproxDistanceWithBuffer = kHl_MaximumEncounterDistance + 100.0
 # 6371.009 km or 6,371,009 m average radius for the Earth
 kHl_EarthRadiusMeters = 6371009.0
+# Maximum encounter distance as a central angle in radians
+kHl_MaximumEncounterRadians = kHl_MaximumEncounterDistance / kHl_EarthRadiusMeters
+# Maximum encounter distance as a value of the inner Haversine expression, haversin(d/r).
+# Both sqrt and arcsin are monotonic, so d <= 150m exactly when haversin(d/r) <= sin^2(75m/r),
+# and the distance itself doesn't need to be calculated to test for an encounter.
+kHl_HaversineThresholdInner = math.sin(kHl_MaximumEncounterRadians / 2.0) ** 2
+# Latitude half-width in radians of the bounding box around a location that holds every
+# point within the maximum encounter distance, with a tiny margin so rounding never
+# rejects a pair right at the limit.  Its sine is the basis for the longitude half-width.
+kHl_BoundingBoxRadians = kHl_MaximumEncounterRadians * 1.000001
+kHl_BoundingBoxSinRadians = math.sin(kHl_BoundingBoxRadians)
+
+# Output line format for an encounter (see the summary above), without the newline:
+#   <unixtime>|<username1>|<lat1>|<long1>|<username2>|<lat2>|<long2>
+kHl_EncounterOutputFormat = '%d|%s|%s|%s|%s|%s|%s'
+
+# Grid cells for the spatial index of user locations.  Each cell spans the same angle in
+# latitude and longitude, at least the maximum encounter distance in latitude, and a
+# whole number of cells circles the equator so longitude cell indices wrap cleanly.
+kHl_GridCellsAroundEquator = int((2.0 * math.pi) / kHl_MaximumEncounterRadians)
+kHl_GridCellRadians = (2.0 * math.pi) / kHl_GridCellsAroundEquator
 
-# Constants for quadrant 2 and 4 boundaries to multiply cos/sin conversion by (-1)
-# These should only be used for the chord length approximation
-kHl_Quad2MinRadians = math.pi / 2.0
-kHl_Quad2MaxRadians = math.pi
-kHl_Quad4MinRadians = -1.0 * kHl_Quad2MinRadians
-kHl_Quad4MaxRadians = 0.0
+
+#####################
+##### Distance functions
+#####################
+
+# These functions work on plain floats in radians so they can be shared by the user
+# methods and the encounter scan, without any attribute lookups in the calculations.
+# The cos(p) values are passed in because they are calculated once per entry at parse time.
+# The math functions and constants are bound as default arguments (the underscore names),
+# so inside the functions they are fast local lookups instead of global and module
+# attribute lookups on every call.  Callers should never pass them.
+
+# float - Return the inner Haversine expression haversin(d/r) for points 1 and 2,
+#         which can be compared directly against kHl_HaversineThresholdInner.
+# Usage:  inner = haversineInner(p1, p2, l1, l2, cosp1, cosp2)
+def haversineInner(p1, p2, l1, l2, cosp1, cosp2, _sin=math.sin):
+    sinDeltaHalfP = _sin((p2 - p1) * 0.5)
+    sinDeltaHalfL = _sin((l2 - l1) * 0.5)
+    return (sinDeltaHalfP * sinDeltaHalfP) + (cosp1 * cosp2 * sinDeltaHalfL * sinDeltaHalfL)
+
+
+# float - Return the distance in meters between points 1 and 2 using the Haversine formula.
+#         The inner expression is repeated here to save a function call.
+# Usage:  dist = haversineDistance(p1, p2, l1, l2, cosp1, cosp2)
+def haversineDistance(p1, p2, l1, l2, cosp1, cosp2,
+                      _sin=math.sin, _asin=math.asin, _sqrt=math.sqrt,
+                      _diameter=2.0 * kHl_EarthRadiusMeters):
+    sinDeltaHalfP = _sin((p2 - p1) * 0.5)
+    sinDeltaHalfL = _sin((l2 - l1) * 0.5)
+    return _diameter * _asin(_sqrt((sinDeltaHalfP * sinDeltaHalfP) +
+                                   (cosp1 * cosp2 * sinDeltaHalfL * sinDeltaHalfL)))
+
+
+# float - Return the approximate distance in meters between points 1 and 2 using the
+#         equirectangular (flat earth) approximation.  The delta longitude is wrapped
+#         into [-pi, pi] so points on either side of the antimeridian stay close.
+# Usage:  dist = equirectangularDistance(p1, p2, l1, l2, cosp1, cosp2)
+def equirectangularDistance(p1, p2, l1, l2, cosp1, cosp2,
+                            _hypot=math.hypot, _pi=math.pi, _radius=kHl_EarthRadiusMeters):
+    deltaL = l2 - l1
+    if(deltaL > _pi):
+        deltaL -= 2.0 * _pi
+    elif(deltaL < -_pi):
+        deltaL += 2.0 * _pi
+    if(cosp2 < cosp1):
+        cosp1 = cosp2
+    return _radius * _hypot(p2 - p1, deltaL * cosp1)
+
+
+# float - Return the longitude half-width in radians of the bounding box around a point
+#         at a latitude with the given cos(p), which holds every point within the maximum
+#         encounter distance:  asin(sin(d) / cos(p)), or pi (all longitudes) when the
+#         circle around the point holds a pole.
+# Usage:  boxLong = boundingBoxLongRadians(cosp)
+def boundingBoxLongRadians(cosp, _asin=math.asin, _pi=math.pi,
+                           _boxSinRadians=kHl_BoundingBoxSinRadians):
+    if(cosp > _boxSinRadians):
+        return _asin(_boxSinRadians / cosp)
+    return _pi
+
+
+# Integer - Record every encounter between the entry at row idx2 (posted by user id userId2
+#           at the given time) and the candidate users, and return how many were added.
+#           A candidate has an encounter if it is active (its last posted row is at or after
+#           activeRowStart), the pair was not encountered within the encounter time limit,
+#           and the two locations are within the encounter distance.  Candidates outside
+#           the bounding box around the new entry's location are rejected first with a
+#           couple of comparisons, then optionally with the equirectangular approximation,
+#           before the Haversine test.
+#           The box's longitude half-width is read from its column (see
+#           boundingBoxLongRadians()), since it only depends on the entry's latitude.
+#           Each encounter is written straight into the pair encounter time matrix (both
+#           orders) and the encounter columns, with the entry rows ordered by the users'
+#           name ranks, so nothing is handed back for a second pass.  The entry is the
+#           latest one, so its time is the encounter time.
+#           The columns and per-user and per-pair arrays are passed in, so the loop only
+#           touches plain numbers.
+# Usage:  added = recordEntryEncounters(candidateIds, userId2, idx2, activeRowStart, time,
+#                                       userLastRows, userNameRanks, pairEncounterTimes, userCount,
+#                                       latR, longR, cosLatR, boxLongR, approxFirst,
+#                                       encounterTimes, encounterRows1, encounterRows2)
+def recordEntryEncounters(candidateIds, userId2, idx2, activeRowStart, time,
+                          userLastRows, userNameRanks, pairEncounterTimes, userCount,
+                          latR, longR, cosLatR, boxLongR, approxFirst,
+                          encounterTimes, encounterRows1, encounterRows2,
+                          _sin=math.sin, _pi=math.pi,
+                          _equirectangular=equirectangularDistance,
+                          _boxRadians=kHl_BoundingBoxRadians,
+                          _approxLimit=kHl_MaximumApproxDistanceWithBuffer,
+                          _thresholdInner=kHl_HaversineThresholdInner,
+                          _encounterLimit=kHl_EncounterTimeLimit):
+    p2 = latR[idx2]                           # values for the new entry, shared by all candidates
+    l2 = longR[idx2]
+    cosp2 = cosLatR[idx2]
+    boxLongRadians = boxLongR[idx2]           # longitude half-width of the bounding box
+    pairRowStart = userId2 * userCount        # row of the new entry's user in the pair matrix
+    nameRank2 = userNameRanks[userId2]
+    added = 0
+    for userId1 in candidateIds:
+        idx1 = userLastRows[userId1]
+        if(idx1 < activeRowStart):            # skip user if inactive (or not posted yet)
+            continue
+        lastEncounterTime = pairEncounterTimes[pairRowStart + userId1]  # skip pair if already
+        if(lastEncounterTime <= time < lastEncounterTime + _encounterLimit):  #  encountered within limit
+            continue
+        p1 = latR[idx1]
+        deltaP = p2 - p1
+        if((deltaP > _boxRadians) or (deltaP < -_boxRadians)):  # skip users outside the box
+            continue
+        l1 = longR[idx1]
+        deltaL = l2 - l1
+        if(deltaL < 0.0):
+            deltaL = -deltaL
+        if(deltaL > _pi):                     # wrap around the antimeridian
+            deltaL = (2.0 * _pi) - deltaL
+        if(deltaL > boxLongRadians):
+            continue
+        cosp1 = cosLatR[idx1]
+        if(approxFirst and                    # optionally skip obviously distant users
+           (_equirectangular(p1, p2, l1, l2, cosp1, cosp2) > _approxLimit)):
+            continue
+        sinDeltaHalfP = _sin(deltaP * 0.5)    # haversin() is even and 2*pi periodic, so the
+        sinDeltaHalfL = _sin(deltaL * 0.5)    #  wrapped deltas give the same result
+        if(((sinDeltaHalfP * sinDeltaHalfP) + (cosp1 * cosp2 * sinDeltaHalfL * sinDeltaHalfL))
+           <= _thresholdInner):
+            pairEncounterTimes[pairRowStart + userId1] = time        # add encounter if new and close enough
+            pairEncounterTimes[(userId1 * userCount) + userId2] = time
+            encounterTimes.append(time)
+            if(userNameRanks[userId1] < nameRank2):
+                encounterRows1.append(idx1)
+                encounterRows2.append(idx2)
+            else:
+                encounterRows1.append(idx2)
+                encounterRows2.append(idx1)
+            added += 1
+    return added
 
 
 #####################
 ##### Class definitions
 #####################
 
-### HlLocation class ###
-#   It holds latitude and longitude values in up to three formats.  To save some space,
-#   it initially has zero references or values.
-#   -- NOTE:  The class bothers with all three to avoid assuming the input file and output
-#             file formats the latitude and longitude strings as ".14g" (14 digit precision, general).
-#             Saving the input string makes it easy to match all digits in later output.
-#   When instantiating the class, provide the latitude and longitude as signed decimal strings,
-#   where both latitude and longitude are in degrees between -180 and 180.
-#
-#   Usage:  myNewLocation = HlLocation(latitude_degrees_string, longitude_degrees_string)
-class HlLocation:
-    latD   = None  # floats for lat, long in degrees
-    longD  = None
-    latDS  = None  # strings for lat, long (given input)
-    longDS = None
-    latR   = None  # floats for lat, long in radians
-    longR  = None
-
-    # Initialize a new location object, given latitude and longitude as signed decimal strings
-    def __init__(self, inLat, inLong):
-        self.latDS = inLat
-        self.longDS = inLong
-
-    # String - Get the initial latitude string (degrees)
-    def latitudeString(self):            
-        return self.latDS
-
-    # String - Get the initial longitude string (degrees)
-    def longitudeString(self):
-        return self.longDS
-
-
-    # float - Return the longitude in either radians (-pi to pi) or degrees (assumes -180 to 180)
-    #         If results are not already stored, perform any necessary conversions and store them.
-    # Usage:  longInRadians = locObject.longitude(True)
-    #         longInDegrees = locObject.longitude(False)
-    def longitude(self, useRadians):
-        if(useRadians):
-            if(self.longR == None):
-                self.longR = math.radians(float(self.longDS))
-            return self.longR
-        else:
-            if(self.longD == None):
-                self.longD = float(self.longDS)
-            return self.longD
-
-    # float - Return the latitude in either radians (-pi to pi) or degrees (assumes -180 to 180)
-    #         If results are not already stored, perform any necessary conversions and store them.
-    # Usage:  latInRadians = locObject.latitude(True)
-    #         latInDegrees = locObject.latitude(False)
-    def latitude(self, useRadians):
-        if(useRadians):
-            if(self.latR == None):
-                self.latR = math.radians(float(self.latDS))
-            return self.latR
-        else:
-            if(self.latD == None):
-                self.latD = float(self.latDS)
-            return self.latD
-
+# The encounter, data entry, and user classes are new-style classes with __slots__,
+# so each instance stores its attributes in fixed slots instead of a per-instance dict.
+# This makes every instance smaller and attribute access a little faster.  All slots are
+# set in __init__.
 
 ### HlEncounter class ###
-#   It holds the two user names, two locations, and posted unixtime for an
-#   encounter between two users.  The posted unixtime corresponds to the timestamp
-#   for the later of the two entries triggering the valid encounter.
+#   It holds the two user names, the two locations' latitude and longitude strings,
+#   and posted unixtime for an encounter between two users.  The posted unixtime
+#   corresponds to the timestamp for the later of the two entries triggering the
+#   valid encounter.
 #   The valid flag should be True except for an attempt to create an encounter for
 #   a user with itself.  It does not check for invalid inputs otherwise.
-#   An encounter can print itself in the desired format.
+#   The processor keeps its encounters in columns, and creates an encounter as a view
+#   of one of them when it is requested (see HlProcessor.getEncounter()).
+#   An encounter can format itself as an output line; the processor prints all of the
+#   encounters in the same format directly from its columns.
 #
-#   Usage:  newEncounter = HlEncounter(user0_name, user0_lastUpdateTime, user0_lastUpdateLocation,
-#                                      user1_name, user1_encounterTime,  user1_encounterLocation)
-#           newEncounter.printSelf()
-class HlEncounter:
-    username1 = None    # user names
-    username2 = None
-    loc1  = None        # user locations
-    loc2  = None
-    time  = None        # later timestamp (usually when user1's report caused an encounter)
-    valid = False       # encounter is valid
-
-    # Initialize a new HlEncounter object with time stamp, user names, and user locations
-    def __init__(self, inTime, inUsername1, inLoc1, inUsername2, inLoc2):
+#   Usage:  newEncounter = HlEncounter(encounter_time,
+#                                      user0_name, user0_latitude_string, user0_longitude_string,
+#                                      user1_name, user1_latitude_string, user1_longitude_string)
+class HlEncounter(object):
+    __slots__ = ('username1',   # user names
+                 'username2',
+                 'lat1S',       # user location strings for lat, long (given input)
+                 'long1S',
+                 'lat2S',
+                 'long2S',
+                 'time',        # later timestamp (usually when user1's report caused an encounter)
+                 'valid')       # encounter is valid
+
+    # Initialize a new HlEncounter object with time stamp, user names, and user location strings
+    def __init__(self, inTime, inUsername1, inLat1, inLong1, inUsername2, inLat2, inLong2):
         if(inUsername1 == inUsername2):   # invalid encounter with one's self
             if(do_debug):
-                print 'ERROR:  Attempted to create an invalid encounter with user1 %s and user2 %s\n' % (inUser1, inUser2)
+                print('ERROR:  Attempted to create an invalid encounter with user1 %s and user2 %s\n' % (inUsername1, inUsername2))
+            self.username1 = self.username2 = None
+            self.lat1S = self.long1S = self.lat2S = self.long2S = None
+            self.time  = None
             self.valid = False
             return
         elif(inUsername1 < inUsername2):  # order lexigraphically for output; expected order
             self.username1 = inUsername1
             self.username2 = inUsername2
-            self.loc1  = inLoc1
-            self.loc2  = inLoc2
+            self.lat1S  = inLat1
+            self.long1S = inLong1
+            self.lat2S  = inLat2
+            self.long2S = inLong2
         else:                             # swap when input order is reversed
             self.username1 = inUsername2
             self.username2 = inUsername1
-            self.loc1  = inLoc2
-            self.loc2  = inLoc1
+            self.lat1S  = inLat2
+            self.long1S = inLong2
+            self.lat2S  = inLat1
+            self.long2S = inLong1
         self.time  = inTime
         self.valid = True
 
-    # Void - Print all the important values in a specific single-line format
-    # Usage:  newEncounter.printSelf()
-    #   <unixtime_integer>|<first_alphabetical_username>|<signed_decimal_string>|<signed_decimal_string>|<second_alphabetical_username>|<signed_decimal_string>|<signed_decimal_string>
-    #   Example:  1327418725|danny|37.77695245908|-122.39847741481|unclejoey|37.777335807234|-122.39812024905
-    def printSelf(self):
+    # String - Return all the important values in the single-line output format,
+    #          or None for an invalid encounter.  (No I/O; see HlProcessor.printEncounters().)
+    # Usage:  line = newEncounter.formatSelf()
+    def formatSelf(self):
         if(self.valid):
-            print '%d|%s|%s|%s|%s|%s|%s' % (
-                self.time, self.username1,
-                self.loc1.latitudeString(), self.loc1.longitudeString(),
-                self.username2,
-                self.loc2.latitudeString(), self.loc2.longitudeString())
-        elif(do_debug):
-            print 'ERROR:  Invalid encounter, most likely the users were equal.';
+            return kHl_EncounterOutputFormat % (self.time, self.username1, self.lat1S, self.long1S,
+                                                self.username2, self.lat2S, self.long2S)
+        return None
 
 
 ### HlDataEntry class ###
-#   It holds the username, unixtime, and location of a data update in the input file.
-#   When instantiating it, provide a string with a line from the input file, or a
-#   string matching its format.  The format is the following four fields separated by
-#   pipe characters, with no leading whitespace:
+#   It holds the username, unixtime, and location strings of a data update in the
+#   input file, along with the row index of the update in the processor's columns
+#   and the id of the user, so users can be found and compared without their names.
+#   The processor parses the whole input file into its columns at once, and creates
+#   a data entry as a view of one row when the entry is requested.  Each line in the
+#   input file has the following four fields separated by pipe characters, with no
+#   leading whitespace:
 #     <username>|<long_integer_unixtime>|<signed_floating_point_latitude_degrees>|<signed_floating_point_longitude_degrees>
 #   Example:
 #     danny|1327401809|37.775011290418|-122.39381636393
+#   -- NOTE:  Saving the input string avoids assuming the input file and output file
+#             format the latitude and longitude strings as ".14g" (14 digit precision, general),
+#             and makes it easy to match all digits in later output.
+#             The converted radian values are found in the processor's coordinate columns
+#             at the row index.
 #
-# Usage:  newDataEntry = HlDataEntry(inputLine)
-class HlDataEntry:
-    username  = None
-    time      = None
-    loc       = None
-    valid     = False
-
-    # Initialize a new data entry from an input string
-    def __init__(self, inString):
-        inString = inString.rstrip('\r\n')      # strip end-of-line characters
-        columns = string.split(inString, '|')   # split string into fields
-        numColumns = len(columns)
-        if(numColumns > 0):                     
-            if(numColumns != 4):                # there should be four fields for a valid entry
-                if(do_debug):
-                    print 'ERROR:  Invalid data entry line - does not have 4 elements separated by pipe characters.\n';
-                    return
-            self.username = columns[0]          # username is first
-            self.time     = long(columns[1])    # convert time from string to long integer
-            self.loc      = HlLocation(columns[2], columns[3])  # create location object with strings
-            self.valid = True
+# Usage:  newDataEntry = HlDataEntry(username, unixtime, latitude_string, longitude_string, row_index, user_id)
+class HlDataEntry(object):
+    __slots__ = ('username',
+                 'time',
+                 'latS',      # strings for lat, long (given input)
+                 'longS',
+                 'idx',       # row index in the processor's columns
+                 'userId')    # id of the user; index in the processor's user list
+
+    # Initialize a new data entry from the values of a parsed row
+    def __init__(self, inUsername, inTime, inLat, inLong, inIdx, inUserId):
+        self.username = inUsername
+        self.time     = inTime
+        self.latS     = inLat
+        self.longS    = inLong
+        self.idx      = inIdx
+        self.userId   = inUserId
 
 
     # Void - Set the username to a new string
@@ -347,41 +501,35 @@ class HlDataEntry:
         self.time = inTime
 
 
-    # Void - Set the location object reference to a new location object
-    # Not currently used.
-    def setLoc(self, inLoc):
-        self.loc = inLoc
-
-
-    # Boolean - Check if the data entry is currently valid
-    def isValid(self):
-        return self.valid
-
-
 ### HlUser class ###
 #   It holds the name, last unixtime posted during the current processing cycle,
-#   the last location posted during the current processing cycle, and a dictionary
-#   pairing other users with the time stamps of their last shared encounters.
-#   For the purpose of just creating a user with a given name, the time and location
-#   can be initially set to None and updated later.
-# Usage:  newUser = HlUser(username, post_time, post_loc_object)
-class HlUser:
-    name = None                   # user name
-    lastPostedTime = None         # last unixtime posted during processing cycle
-    lastPostedLoc  = None         # last location posted during processing cycle
-    userEncounterDict = None      # lookup table for encounter times with other users
-    otherUserSet = None           # set of other interesting users to check for encounters
-    lastPostedLocCosP = None      # calculated cos(p) for the last posted location - updated when needed
-
-    # Initialize a user with a name string, posted time value, and posted location object
-    # Create an empty encounter lookup table and empty set of other interesting users
-    def __init__(self, inName, time, loc):
+#   and the last location posted during the current processing cycle.  The time stamps
+#   of its last shared encounters with other users are kept in the processor's pair
+#   encounter time array (see HlProcessor).
+#   The last location is kept only as the row index of the last posted entry; its
+#   latitude and longitude strings (for output) and numeric values are read from the
+#   processor's columns at that row.
+#   Each user has an integer id, its index in the processor's user list.
+#   For the purpose of just creating a user with a given name, the time can be initially
+#   set to None, and the time and location updated later.
+# Usage:  newUser = HlUser(username, user_id, post_time, processor)
+class HlUser(object):
+    __slots__ = ('name',                # user name
+                 'id',                  # user id; index in the processor's user list
+                 'lastPostedTime',      # last unixtime posted during processing cycle
+                 'lastPostedIdx',       # column row for the last location posted during processing cycle
+                 'lastPostedCell',      # grid cell key for the last posted location in the processor's cell dict
+                 'processor')           # processor holding the coordinate columns and pair encounter times
+
+    # Initialize a user with a name string, user id, posted time value, and the processor
+    # holding the coordinate columns and user list.
+    def __init__(self, inName, inId, time, processor):
         self.name = inName
+        self.id = inId
         self.lastPostedTime = time
-        self.lastPostedLoc = loc
-        self.lastPostedLocCosP = None
-        self.userEncounterDict = {}
-        self.otherUserSet = set()
+        self.lastPostedIdx = None
+        self.lastPostedCell = None
+        self.processor = processor
 
 
     # Void - Update the last posted time
@@ -389,110 +537,79 @@ class HlUser:
         self.lastPostedTime = time
     
 
-    # Void - Update the last posted location object reference
-    #        Clear the obsolete cos(p) value; recalc only when requested
-    def updateLastPostedLoc(self, loc):
-        self.lastPostedLoc = loc
-        self.lastPostedLocCosP = None
+    # Void - Update the column row of the last posted location
+    def updateLastPostedLoc(self, idx):
+        self.lastPostedIdx = idx
 
 
     # Void - Create or update the stored unixtime for an encounter with a user
+    #        (written for both orders of the users in the processor's pair encounter time matrix)
     def updateEncounterWithUser(self, user, time):
         if(user != None):
-            self.userEncounterDict[user.name] = time
+            self.processor.pairEncounterTimes[self.processor.pairIndex(self, user)] = time
+            self.processor.pairEncounterTimes[self.processor.pairIndex(user, self)] = time
         else:
-            print 'ERROR: User provided for encounter update with %s is None.' % (self.name)
+            print('ERROR: User provided for encounter update with %s is None.' % (self.name))
 
 
     # Long - Return the last unixtime for an encounter with a user,
     #        or --None-- if one has not yet occurred.
     def lastEncounterWithUser(self, user):
         if(user != None):
-            if(user.name in self.userEncounterDict):
-                return self.userEncounterDict[user.name]
+            lastEncounterTime = self.processor.pairEncounterTimes[self.processor.pairIndex(self, user)]
+            if(lastEncounterTime != kHl_NoEncounterTime):
+                return lastEncounterTime
         return None
 
 
-    # Void - Add new user to set if it doesn't exist
-    def addInterestingUser(self, user):
-        if(user not in self.otherUserSet):
-            self.otherUserSet.add(user)
-
-
-    # Boolean - Check if other user is of interest to this one
-    def isUserInteresting(self, user):
-        return (user in self.otherUserSet)
-
-
-    # Set - Return the set of all other interesting users
-    def allOtherInterestingUsers(self):
-        return self.otherUserSet
-
-
-    # Void - Clean up list of interesting users; currently just removes self
-    #        if it was added by accident.
-    def cleanInterestingUsers(self):
-        if(self in self.otherUserSet):
-            self.otherUserSet.discard(self)
-
-
     # Boolean - Return true if the time argument is valid and greater than or equal
     #           to the user's saved time, and the delta between the two is less than
-    #           the active time limit.
+    #           the active time limit.  (deltaT shouldn't be neg if doing in order.)
     def userIsStillActive(self, time):
-        if(time != None):
-            if(self.lastPostedTime == None):
-                return False
-            deltaT = time - self.lastPostedTime
-            if(deltaT < 0):                         # deltaT shouldn't be neg if doing in order
-                return False
-            if(deltaT < kHl_UserActiveTimeLimit):   
-                return True
+        if((time != None) and (self.lastPostedTime != None)):
+            return (0 <= (time - self.lastPostedTime) < kHl_UserActiveTimeLimit)
         return False
 
 
     # Boolean - Return true if the user has been encountered previously, the
     #           time argument is greater than or equal to the last encounter time,
     #           and the delta between the two is less than the encounter time limit.
+    #           A pair without an encounter holds kHl_NoEncounterTime, which is never
+    #           within the limit, so a single chained comparison covers every case.
     def alreadyEncounteredUserWithinLimit(self, user, time):
         if((user != None) and (time != None)):                     # want valid arguments
-            lastEncounterTime = self.lastEncounterWithUser(user)   # lookup last encounter time
-            if(lastEncounterTime != None):                         # we have one, so calc delta
-                deltaT = time - lastEncounterTime
-                if(deltaT < 0):                    # deltaT shouldn't be neg if doing in order
-                    return False
-                if(deltaT < kHl_EncounterTimeLimit):
-                    return True
+            lastEncounterTime = self.processor.pairEncounterTimes[self.processor.pairIndex(self, user)]
+            return (lastEncounterTime <= time < lastEncounterTime + kHl_EncounterTimeLimit)
         return False
 
 
     # float - Return the cos(p) value for the last posted location.
-    #         If the cached value doesn't exist, calculated it and cache it for
-    #         other possible comparisons with this user.
+    #         It is calculated once per entry when the entry is parsed.
     def cosPValForLastPostedLocation(self):
-        if(self.lastPostedLocCosP == None):
-            self.lastPostedLocCosP = math.cos(self.lastPostedLoc.latitude(True))
-        return self.lastPostedLocCosP
+        return self.processor.cosLatR[self.lastPostedIdx]
 
 
     # Boolean - Return true if distance from this user to another is less than
     #           the global encounter distance limit.  Optionally filter
-    #           first with chord distance before running Haversine function.
-    #           Chords are smaller than surface arcs, so if a chord distance is
-    #           greater than the limit, the Haversine distance should also be greater.
-    #
-    #           Chords are an excellent approximation for positions that are already
-    #           very close, but they may not save much computation.  Skip the
-    #           approximation option unless using a faster filter.
+    #           first with the equirectangular approximation before running
+    #           the Haversine function.  The approximation is very close for
+    #           positions that are near each other, so if it is greater than the
+    #           limit plus a buffer, the Haversine distance is also greater.
+    #           The Haversine test compares the inner expression against its threshold,
+    #           which skips the sqrt() and arcsin() calls.
     def distanceToUserWithinLimit(self, user, approxFirst):
         if(user != None):
-            if((self.lastPostedLoc != None) and
-               (user.lastPostedLoc != None)):
-                if(approxFirst):         # do chord approximation first if desired, with small buffer
-                    if(self.distanceToUserSimpleChord(user) > kHl_MaximumApproxDistanceWithBuffer):
+            if((self.lastPostedIdx != None) and
+               (user.lastPostedIdx != None)):
+                if(approxFirst):         # do the approximation first if desired, with small buffer
+                    if(self.distanceToUserEquirectangular(user) > kHl_MaximumApproxDistanceWithBuffer):
                         return False
                 # do the Haversine formula if we fall through
-                if(self.distanceToUserHaversine(user) <= kHl_MaximumEncounterDistance):
+                cols = self.processor
+                if(haversineInner(cols.latR[self.lastPostedIdx], cols.latR[user.lastPostedIdx],
+                                  cols.longR[self.lastPostedIdx], cols.longR[user.lastPostedIdx],
+                                  cols.cosLatR[self.lastPostedIdx], cols.cosLatR[user.lastPostedIdx])
+                   <= kHl_HaversineThresholdInner):
                     return True
         return False
     
@@ -500,104 +617,89 @@ class HlUser:
     # float - Return the distance between this user and another user using
     #         the Haversine formula.
     def distanceToUserHaversine(self, user):
-        p1 = self.lastPostedLoc.latitude(True)
-        p2 = user.lastPostedLoc.latitude(True)
-        l1 = self.lastPostedLoc.longitude(True)
-        l2 = user.lastPostedLoc.longitude(True)
+        cols = self.processor
+        idx1 = self.lastPostedIdx
+        idx2 = user.lastPostedIdx
+        latR = cols.latR
+        longR = cols.longR
+        cosLatR = cols.cosLatR
+        return haversineDistance(latR[idx1], latR[idx2], longR[idx1], longR[idx2],
+                                 cosLatR[idx1], cosLatR[idx2])
+
+
+    # float - Return the approximate distance between this user and another user using
+    #         the equirectangular approximation.  It needs no trig functions, and the
+    #         values are very close to the Haversine formula for small distances.
+    def distanceToUserEquirectangular(self, user):
+        cols = self.processor
+        return equirectangularDistance(cols.latR[self.lastPostedIdx], cols.latR[user.lastPostedIdx],
+                                       cols.longR[self.lastPostedIdx], cols.longR[user.lastPostedIdx],
+                                       cols.cosLatR[self.lastPostedIdx], cols.cosLatR[user.lastPostedIdx])
 
-        # Once these are calculated they can be re-used until next location update,
-        # so they are provided by and cached in the user objects.
-        cosp1 = self.cosPValForLastPostedLocation()
-        cosp2 = user.cosPValForLastPostedLocation()
-
-        sinDeltaHalfP = math.sin((p2 - p1)/2.0)
-        sinDeltaHalfL = math.sin((l2 - l1)/2.0)
-        sin2DeltaHalfP = sinDeltaHalfP * sinDeltaHalfP
-        sin2DeltaHalfL = sinDeltaHalfL * sinDeltaHalfL
-
-        dist = 2 * kHl_EarthRadiusMeters * (
-            math.asin(math.sqrt(sin2DeltaHalfP + (cosp1 * cosp2 * sin2DeltaHalfL))))
-        return dist
-
-    
-    # float - Return the distance between this user and another user using
-    #         the sphere chord length formula (from dX, dY, dZ).
-    #         This is only an optional optimization to remove an arcsin()
-    #         function, although it adds some sqrt() calls.  The values
-    #         are quite close to the Haversine formula for small distances.
-    def distanceToUserSimpleChord(self, user):
-        p1 = self.lastPostedLoc.latitude(True)
-        p2 = user.lastPostedLoc.latitude(True)
-        l1 = self.lastPostedLoc.longitude(True)
-        l2 = user.lastPostedLoc.longitude(True)
-
-        # Once these are calculated they can be re-used until next location update,
-        # so they are provided by and cached in the user objects.  They are common
-        # to this optional function and the required Haversine formula.
-        cosp1 = self.cosPValForLastPostedLocation()
-        cosp2 = user.cosPValForLastPostedLocation()
-
-        # These are not needed in the Haversine formula so they aren't cached.
-        # They could be...
-        cosl1 = math.cos(l1)
-        cosl2 = math.cos(l2)
-
-        sinp1 = self.sinFromCos(p1, cosp1)
-        sinp2 = self.sinFromCos(p2, cosp2)
-        sinl1 = self.sinFromCos(l1, cosl1)
-        sinl2 = self.sinFromCos(l2, cosl2)
-
-        deltaX = kHl_EarthRadiusMeters * ((cosp2 * cosl2) - (cosp1 * cosl1))
-        deltaY = kHl_EarthRadiusMeters * ((cosp2 * sinl2) - (cosp1 * sinl1))
-        deltaZ = kHl_EarthRadiusMeters * (sinp2 - sinp1)
-        dist = math.sqrt((deltaX * deltaX) + (deltaY * deltaY) + (deltaZ * deltaZ))
-        return dist
-    
-    # float - Return sin(x) given cos(x) and x.  Uses sqrt instead of sin(x)
-    #         and adjusts sign of sin(x) for quadrant of x.
-    def sinFromCos(self, angle, cosVal):
-        # quadrant 1, cos+/sin+  1.0 mult
-        # quadrant 2, cos-/sin+ -1.0 mult
-        # quadrant 3, cos-/sin-  1.0 mult
-        # quadrant 4, cos+/sin- -1.0 mult
-        # sin^2(x) + cos^2(x) = 1
-        # sin(x) = (sign) * sqrt(1 - cos^2(x))
-        sinVal = math.sqrt(1 - (cosVal * cosVal))
-        if(((angle >= kHl_Quad2MinRadians) and (angle < kHl_Quad2MaxRadians)) or
-           ((angle >= kHl_Quad4MinRadians) and (angle < kHl_Quad4MaxRadians))):
-            sinVal = -1.0 * sinVal
-        return sinVal
-    
 
 ### HlProcessor class ###
 #   This class handles the processing of the user data file.  It holds a
-#   list of data entries from the file, a lookup table pairing user names
-#   with user objects, and a list of valid encounters between users.
-#   NOTE:  The list of valid encounters is empty until findEncounters() is called!
+#   structure of arrays with a column for each parsed field of the data entries in
+#   the file, a lookup table pairing user names with user objects, and columns of
+#   valid encounters between users.
+#   The whole file is parsed into the columns at once, one field at a time, so the
+#   conversions run over entire columns instead of line by line.  The coordinate
+#   columns hold latitude, longitude, and cos(latitude), all in radians, and the
+#   encounter scan reads plain floats from them.  An entry's idx is its row in the columns.
+#   The last encounter unixtime for each pair of users is kept in one flat array of longs,
+#   a dense userCount x userCount matrix indexed by the pair's user ids, instead of a dict
+#   of names in each user.  Both orders of a pair are written on an encounter, so a lookup
+#   can use either user's row directly.
+#   The row of each user's last posted entry is also kept in a flat array indexed by
+#   user id, so the encounter scan can check candidates without touching user objects.
+#   A grid index of user locations (cell key -> set of user ids) limits the encounter scan
+#   to users in the same or nearby cells.
+#   Each encounter is kept as its unixtime and the rows of the two entries involved, in
+#   three parallel arrays, since the rows already hold the names and location strings.
+#   The arrays are array('l') columns, which store machine integers contiguously and grow
+#   geometrically in C on append, so recording an encounter creates no Python object and
+#   no separate capacity or count needs to be managed (the count is the array length).
+#   Sorting encounters only builds a list of encounter indices in output order, using
+#   integer sort keys precomputed from the users' alphabetical name ranks.
+#   NOTE:  The encounter columns are empty until findEncounters() is called!
 #
 #   Inputs:  string   - input file name
-#            booleans - use chord length approximation filter, extra final sort
+#            booleans - use equirectangular approximation filter, extra final sort
 #
 #   Usage:  newProcessor = HlProcessor(input_file_name, useApproxFilter, extraEncounterSort)
 #           newProcessor.findEncounters()
 #           newProcessor.printEncounters()
 class HlProcessor:
-    encounterList = None          # list of user encounter (HlEncounter) objects
+    encounterTimes = None         # columns for the encounters: unixtimes,
+    encounterRows1 = None         #   rows of the entries for the first alphabetical user,
+    encounterRows2 = None         #   and rows of the entries for the second alphabetical user
+    encounterOrder = None         # list of encounter indices in output order, or None for column order
     userDict = None               # dict of user (HlUser) objects with names as keys
+    userList = None               # list of user (HlUser) objects indexed by user id
     file = None                   # input file
-    fileLines = None              # lines from the file
-    filterWithApprox = False      # optional filter flag for using chord approximations
+    filterWithApprox = False      # optional filter flag for using equirectangular approximations
     sortFinalList = False         # optional filter flag to sort encounter output (consistency for same unixtime)
-    dataEntries = None            # list of data entry (HlDataEntry) objects
-    totalLineCount = 0            # file line count
-    currentLineIdx = 0            # current line index
+    usernames = None              # columns for the data entries: username strings,
+    userIds = None                #   user ids,
+    times = None                  #   unixtimes,
+    latS = None                   #   latitude and longitude strings (given input),
+    longS = None
+    latR = None                   #   latitude, longitude, and cos(latitude) in radians,
+    longR = None
+    cosLatR = None
+    boxLongR = None               #   and the longitude half-width of the bounding box, in radians
+    entryCount = 0                # number of valid data entries (rows in the columns)
+    userLastRows = None           # array of the row of each user's last posted entry, indexed by user id
+    userNameRanks = None          # array of the rank of each user's name in alphabetical order, indexed by user id
+    pairEncounterTimes = None     # flat symmetric matrix of the last encounter unixtime for each pair of users
+    cellDict = None               # dict of grid cell keys to sets of ids of users last posted in the cell
     
     # Initialize the processor with a file name and flags for the
     # optional filter and optional sort of encounters (for consistent
     #  ordering of multiple encounters with the same unixtime).
     def __init__(self, filename, useApproxFilter, extraEncounterSort):
         if(filename == None):
-            print 'ERROR:  A valid input file name was not provided to the processor object.\n'
+            print('ERROR:  A valid input file name was not provided to the processor object.\n')
             exit(1)
         self.file = filename
         self.filterWithApprox = useApproxFilter
@@ -606,162 +708,338 @@ class HlProcessor:
         try:       # attempt to open file for reading or exit with failure message
             fileInput = open(self.file, 'r')
         except:
-            print 'ERROR:  Could not open file %s for reading.\n' % (self.file)
+            print('ERROR:  Could not open file %s for reading.\n' % (self.file))
             exit(1)
         
-        self.fileLines = fileInput.readlines()    # read and close file as soon as possible
+        self.parseFileLines(fileInput)             # parse and close file as soon as possible
         fileInput.close()
-        self.totalLineCount = len(self.fileLines) # get line count and create empty structures
-        self.dataEntries = []
-        self.encounterList = []
+        self.encounterTimes = array('l')
+        self.encounterRows1 = array('l')
+        self.encounterRows2 = array('l')
         self.userDict = {}
-   
-    # HlDataEntry - Return an HlDataEntry object for the entry with a given index
-    # If an entry is requested that has not already been processed, process as many
-    # entries as needed to retrieve it.  Only count lines with valid data as an entry.
-    # NOTE:  This function exists mostly as an abstraction, since we could prepare the
-    #        entire list at once from the file data.  In reality, the entries may be
+        self.userList = []
+        self.cellDict = {}
+        self.userIds = array('l', map(self.incorporateUserIfNew, self.usernames))
+        userCount = len(self.userList)
+        self.userLastRows = array('l', [-1]) * userCount
+        self.userNameRanks = array('l', [0]) * userCount
+        for (rank, userId) in enumerate(sorted(range(userCount), key=lambda i: self.userList[i].name)):
+            self.userNameRanks[userId] = rank
+        self.pairEncounterTimes = array('l', [kHl_NoEncounterTime]) * (userCount * userCount)
+
+    # Void - Parse all the lines from the input file (or any iterable of lines) into the
+    #        columns.  Each line is split into its pipe-separated fields as it is read, so
+    #        the whole file is never held as one string or as a list of lines, and each
+    #        field is then converted as a whole column.  Lines without exactly four fields
+    #        are skipped.  The string columns are kept as the tuples from the transpose, and
+    #        the coordinates are converted to radians in the same pass as the float parse.
+    def parseFileLines(self, fileLines):
+        rows = [line.rstrip('\r\n').split('|') for line in fileLines]
+        validRows = [row for row in rows if(len(row) == 4)]
+        if(do_debug and (len(validRows) != len(rows))):
+            print('ERROR:  Skipped %d invalid data entry lines - they do not have 4 elements separated by pipe characters.\n' % (
+                len(rows) - len(validRows)))
+        self.entryCount = len(validRows)
+        if(self.entryCount > 0):
+            (usernames, times, lats, longs) = zip(*validRows)
+        else:
+            (usernames, times, lats, longs) = ((), (), (), ())
+        self.usernames = usernames
+        self.times = array('l', map(int, times))
+        self.latS = lats
+        self.longS = longs
+        self.latR = array('d', [float(lat) * kHl_DegToRadMult for lat in lats])
+        self.longR = array('d', [float(lon) * kHl_DegToRadMult for lon in longs])
+        self.cosLatR = array('d', map(math.cos, self.latR))
+        self.boxLongR = array('d', map(boundingBoxLongRadians, self.cosLatR))
+
+    # HlDataEntry - Return an HlDataEntry object for the entry with a given index,
+    #               or None if there are no more entries.
+    # NOTE:  This function exists mostly as an abstraction, since the entire file is
+    #        already prepared in the columns.  In reality, the entries may be
     #        broadcast over the Internet and waiting in a queue to be processed.
     def getDataEntry(self, entryIdx):
-        numParsedEntries = len(self.dataEntries)
-        if(entryIdx < numParsedEntries):
-            return self.dataEntries[entryIdx]
-        else:
-            entriesToAdd = 1 + entryIdx - numParsedEntries  # e.g. entry 0, 0 parsed, need to read 1
-            while((entriesToAdd > 0) and (self.currentLineIdx < self.totalLineCount)):
-                newDataEntry = HlDataEntry(self.fileLines[self.currentLineIdx])
-                if(newDataEntry.isValid()):
-                    self.incorporateDataEntryAndUserIfNew(newDataEntry)
-                    entriesToAdd -= 1
-                self.currentLineIdx += 1
-            if(entryIdx < len(self.dataEntries)):
-                return self.dataEntries[entryIdx]
-            return None
-             
-    # Void - Add a new data entry; if the user mapping doesn't exist, create the user object,
-    #        update everyone's sets of interesting users, and add the mapping of the user
-    #        object in the user dict.
-    def incorporateDataEntryAndUserIfNew(self, dataEntry):
-        # we should only call this if dataEntry is already deemed to be valid
-        self.dataEntries.append(dataEntry)
-        if(not dataEntry.username in self.userDict):
-            newUser = HlUser(dataEntry.username, None, None)
-            if(newUser != None):
-                self.updateInterestingUserSets(newUser)
-                self.userDict[newUser.name] = newUser
-
-    # Void - For each user already in the user dict create mutual
-    #        entries for that user and the new user in their sets
-    #        of interesting users.
-    #        Just in case the new user was already added to the user dict,
-    #        remove a self-reference for the new user if it exists.
-    def updateInterestingUserSets(self, newUser):
-        # In this special problem, everyone is interesting to everyone else.
-        for user in self.userDict.values():
-            user.addInterestingUser(newUser)
-            newUser.addInterestingUser(user)
-        # Remove self-interest if we added it unintentionally (i.e., already in user dict)
-        newUser.cleanInterestingUsers()
-
-    # Void - Add a new encounter object with the data for a valid encounter
-    #        to the processor's list of encounters.  The users should hold
-    #        their latest info at the time of the encounter, which is the later
-    #        of the two time stamps.
-    #        Update the user encounter lookup tables within both users for
-    #        later checks for the same people within the encounter time limit.
+        if(entryIdx < self.entryCount):
+            return HlDataEntry(self.usernames[entryIdx], self.times[entryIdx],
+                               self.latS[entryIdx], self.longS[entryIdx], entryIdx,
+                               self.userIds[entryIdx])
+        return None
+
+    # Integer - If the user mapping doesn't exist, create the user object with the next id,
+    #           and add the user object to the user list and its mapping in the user dict.
+    #           Return the id of the user with the given name.
+    #           In this special problem, everyone is interesting to everyone else, so there
+    #           is no per-user bookkeeping of interesting users; adding a user is O(1), and
+    #           the encounter scan considers the other users nearby in the grid index.
+    def incorporateUserIfNew(self, username):
+        user = self.userDict.get(username)
+        if(user == None):
+            user = HlUser(username, len(self.userList), None, self)
+            self.userList.append(user)
+            self.userDict[user.name] = user
+        return user.id
+
+    # Integer - Return the index in the pair encounter time matrix for two users.
+    #           The pair (i, j) is stored at i * userCount + j, in row-major order.
+    #           The matrix is kept symmetric, so (j, i) holds the same unixtime.
+    def pairIndex(self, user0, user1):
+        return (user0.id * len(self.userList)) + user1.id
+
+    # Void - Add a new encounter with the data for a valid encounter to the
+    #        processor's encounter columns.  The users should hold their latest
+    #        info at the time of the encounter, which is the later of the two
+    #        time stamps; the rows of their last posted entries are stored,
+    #        ordered lexigraphically by user name for output.
+    #        Update the pair encounter time for both users for later checks
+    #        for the same people within the encounter time limit.
     def addEncounter(self, user0, user1):
+        if(user0 is user1):                                            # invalid encounter with one's self
+            if(do_debug):
+                print('ERROR:  Attempted to create an invalid encounter with user1 %s and user2 %s\n' % (user0.name, user1.name))
+            return
         latestTime = max(user0.lastPostedTime, user1.lastPostedTime)   # time of latest entry
-        user0.updateEncounterWithUser(user1, latestTime)               # update each other's lookup table
-        user1.updateEncounterWithUser(user0, latestTime)
-        self.encounterList.append(HlEncounter(latestTime, user0.name, user0.lastPostedLoc,
-                                              user1.name, user1.lastPostedLoc))
+        user0.updateEncounterWithUser(user1, latestTime)               # update both of the pair's entries
+        self.encounterTimes.append(latestTime)
+        if(user0.name < user1.name):
+            self.encounterRows1.append(user0.lastPostedIdx)
+            self.encounterRows2.append(user1.lastPostedIdx)
+        else:
+            self.encounterRows1.append(user1.lastPostedIdx)
+            self.encounterRows2.append(user0.lastPostedIdx)
+
+    # Integer - Return the number of encounters found so far.
+    def encounterCount(self):
+        return len(self.encounterTimes)
+
+    # HlEncounter - Return an HlEncounter object for the encounter with a given index
+    #               in the encounter columns, or None if there are no more encounters.
+    # NOTE:  Like getDataEntry(), this exists mostly as an abstraction; the processor
+    #        itself works on the columns.
+    def getEncounter(self, encounterIdx):
+        if(encounterIdx < len(self.encounterTimes)):
+            row1 = self.encounterRows1[encounterIdx]
+            row2 = self.encounterRows2[encounterIdx]
+            return HlEncounter(self.encounterTimes[encounterIdx],
+                               self.usernames[row1], self.latS[row1], self.longS[row1],
+                               self.usernames[row2], self.latS[row2], self.longS[row2])
+        return None
 
     # Void - Update any interesting user state from the current data entry.
     #        (serves mostly as abstraction)
     def updateUserStateFromEntry(self, user, entry):
-        user.updateLastPostedTime(entry.time)
-        user.updateLastPostedLoc(entry.loc)
+        self.updateUserStateFromRow(user, entry.idx)
+
+    # Void - Update any interesting user state directly from a row in the columns,
+    #        including the user's entry in the last posted row array.
+    def updateUserStateFromRow(self, user, idx):
+        user.updateLastPostedTime(self.times[idx])
+        user.updateLastPostedLoc(idx)
+        self.userLastRows[user.id] = idx
+        self.updateUserGridCell(user)
+
+    # Tuple - Return the grid cell key (latitude index, longitude index) for a row
+    #         in the coordinate columns.
+    def gridCellForRow(self, idx):
+        return (int(math.floor(self.latR[idx] / kHl_GridCellRadians)),
+                int(math.floor(self.longR[idx] / kHl_GridCellRadians)) % kHl_GridCellsAroundEquator)
+
+    # Void - Move a user from the grid cell of its previous location (if it is still
+    #        in one) to the grid cell of its last posted location.
+    def updateUserGridCell(self, user):
+        newCell = self.gridCellForRow(user.lastPostedIdx)
+        if(newCell == user.lastPostedCell):
+            return
+        if(user.lastPostedCell != None):
+            self.removeUserFromGridCell(user)
+        if(newCell in self.cellDict):
+            self.cellDict[newCell].add(user.id)
+        else:
+            self.cellDict[newCell] = set([user.id])
+        user.lastPostedCell = newCell
+
+    # Void - Remove a user from its grid cell, and drop the cell once it is empty.
+    def removeUserFromGridCell(self, user):
+        cellUserIds = self.cellDict.get(user.lastPostedCell)
+        if(cellUserIds != None):
+            cellUserIds.discard(user.id)
+            if(not cellUserIds):
+                del self.cellDict[user.lastPostedCell]
+        user.lastPostedCell = None
+
+    # List - Return the ids of all the other users who are active, whose last posted rows
+    #        are at or after the first active row.  Users who haven't posted yet have a
+    #        last posted row of -1, so one comparison per user covers them too.
+    def activeOtherUserIds(self, user, activeRowStart):
+        userId = user.id
+        return [otherId for (otherId, lastRow) in enumerate(self.userLastRows)
+                if((lastRow >= activeRowStart) and (otherId != userId))]
+
+    # List - Return the ids of the other users whose last posted locations are in grid
+    #        cells that could hold an encounter with the user's last posted location.
+    #        Any user found in a cell whose last posted row is before the first active row
+    #        is removed from it, since it can't have an encounter until it posts (and is
+    #        placed) again.
+    #        -- NOTE:  The cells looked up are exactly the ones overlapped by the bounding
+    #                  box around the location (see recordEntryEncounters), which is at most
+    #                  3x3 cells away from the poles.  The longitude reach of a circle
+    #                  with angular radius d around latitude p is asin(sin(d) / cos(p)),
+    #                  so the span of longitude cells grows toward the poles (but stays under
+    #                  half of the cells around the circle, so no cell is looked up twice).
+    #                  When the circle holds a pole, or there are more cells to look up than
+    #                  cells holding users, fall back to all of the other active users.
+    def nearbyOtherUserIds(self, user, activeRowStart):
+        idx = user.lastPostedIdx
+        boxLongRadians = self.boxLongR[idx]
+        if(boxLongRadians >= math.pi):
+            return self.activeOtherUserIds(user, activeRowStart)
+        firstY = int(math.floor((self.latR[idx] - kHl_BoundingBoxRadians) / kHl_GridCellRadians))
+        lastY = int(math.floor((self.latR[idx] + kHl_BoundingBoxRadians) / kHl_GridCellRadians))
+        firstX = int(math.floor((self.longR[idx] - boxLongRadians) / kHl_GridCellRadians))
+        lastX = int(math.floor((self.longR[idx] + boxLongRadians) / kHl_GridCellRadians))
+        if(((lastY - firstY) + 1) * ((lastX - firstX) + 1) > len(self.cellDict)):
+            return self.activeOtherUserIds(user, activeRowStart)
+
+        nearbyUserIds = []
+        userLastRows = self.userLastRows
+        for y in range(firstY, lastY + 1):
+            for x in range(firstX, lastX + 1):
+                cellUserIds = self.cellDict.get((y, x % kHl_GridCellsAroundEquator))
+                if(cellUserIds == None):
+                    continue
+                for otherId in list(cellUserIds):
+                    if(userLastRows[otherId] < activeRowStart):
+                        self.removeUserFromGridCell(self.userList[otherId])
+                    elif(otherId != user.id):
+                        nearbyUserIds.append(otherId)
+        return nearbyUserIds
 
 
 ###############
 ######### Key encounter processing function
 ###############
     # Void - Find all valid encounters from the entire data set, starting with entry 0
-    #        NOTE:  The use of getDataEntry() is abstracted such that it could be the interface
-    #               to a queue of broadcasted updates with little change to this function.
+    #        The entries are read directly from the rows of the columns, in order, without
+    #        creating an HlDataEntry view for each one.
+    #        NOTE:  Reading a row at a time keeps the loop close to an interface for a queue
+    #               of broadcasted updates; getDataEntry() still provides that abstraction.
+    #        The candidate users nearby in the grid index are passed by id to the module
+    #        level recordEntryEncounters() kernel, which checks the activity, encounter time
+    #        limit, and distance for each one using only the columns and the flat per-user
+    #        and per-pair arrays, and records each encounter in the same pass.
+    #        Since the entries are sorted by time, the first row still inside the active
+    #        time window only moves forward; a user is active exactly when its last posted
+    #        row is at or after that row, so activity is an index comparison.
     def findEncounters(self):
-        entryIdx = 0
-        entry = self.getDataEntry(entryIdx)       # get initial entry; function populates userDict
-        while(entry != None):                     # loop while we have remaining entries
-            user = self.userDict[entry.username]  # get user for current entry and update its state
-            self.updateUserStateFromEntry(user, entry)
-            
-            for otherUser in user.allOtherInterestingUsers():     # for all of this user's interesting users
-                if(not otherUser.userIsStillActive(entry.time)):  # skip user if inactive
-                    continue
-                if(not user.alreadyEncounteredUserWithinLimit(otherUser, entry.time)):
-                    if(user.distanceToUserWithinLimit(otherUser, self.filterWithApprox)):
-                        self.addEncounter(user, otherUser)        # add encounter if new and close enough
+        latR = self.latR                          # local references for the hot loop
+        longR = self.longR
+        cosLatR = self.cosLatR
+        boxLongR = self.boxLongR
+        userList = self.userList
+        userIds = self.userIds
+        times = self.times
+        userLastRows = self.userLastRows
+        userNameRanks = self.userNameRanks
+        pairEncounterTimes = self.pairEncounterTimes
+        userCount = len(self.userList)
+        filterWithApprox = self.filterWithApprox
+        encounterTimes = self.encounterTimes
+        encounterRows1 = self.encounterRows1
+        encounterRows2 = self.encounterRows2
+        activeRowStart = 0                        # first row within the active time window
+        for entryIdx in range(self.entryCount):  # loop over the entries in order
+            time = times[entryIdx]
+            activeCutoffTime = time - kHl_UserActiveTimeLimit
+            while(times[activeRowStart] <= activeCutoffTime):  # advance the window start
+                activeRowStart += 1
+            userId = userIds[entryIdx]
+            user = userList[userId]               # get user for current entry and update its state
+            self.updateUserStateFromRow(user, entryIdx)
+
+            recordEntryEncounters(self.nearbyOtherUserIds(user, activeRowStart),
+                                  userId, entryIdx, activeRowStart, time,
+                                  userLastRows, userNameRanks, pairEncounterTimes, userCount,
+                                  latR, longR, cosLatR, boxLongR, filterWithApprox,
+                                  encounterTimes, encounterRows1, encounterRows2)
 
-            entryIdx += 1                       # update entry index and fetch next
-            entry = self.getDataEntry(entryIdx) # -- entry will be None when no more exist
         if(self.sortFinalList):                    # optionally sort the final list of encounters for
-            self.sortEncountersCompletely()        #  consistency with multiple identical time stamps
-
-
-    # OPTIONAL AND *OBSOLETE*
-    # Void - This is an early version of the function that implements a
-    #        brute force approach to finding valid encounters, assuming
-    #        everyone is interesting to everyone else and requiring less
-    #        saved state and fewer lookup mechanisms (like sets of interesting users).
-    #        It looks at entries multiple times, making it very inefficient.
-    #        (It also changed as more structures were added to develop the
-    #         better version above.)
-    def findEncountersBruteForce(self):
-        user0EntryIdx = 0
-        user0Entry = self.getDataEntry(user0EntryIdx)
-        while(user0Entry != None):
-            user0 = self.userDict[user0Entry.username]
-            self.updateUserStateFromEntry(user0, user0Entry)
-
-            user1EntryIdx = user0EntryIdx + 1
-            user1Entry = self.getDataEntry(user1EntryIdx)
-            while(user1Entry != None):
-                if(user1Entry.username == user0Entry.username):
-                    break
-                user1 = self.userDict[user1Entry.username]
-                self.updateUserStateFromEntry(user1, user1Entry)
-
-                if(not user0.userIsStillActive(user1Entry.time)):
-                    break
-                if(not user0.alreadyEncounteredUserWithinLimit(user1, user1Entry.time)):
-                    if(user0.distanceToUserWithinLimit(user1, self.filterWithApprox)):
-                        self.addEncounter(user0, user1)
-                user1EntryIdx += 1
-                user1Entry = self.getDataEntry(user1EntryIdx)
-            user0EntryIdx += 1
-            user0Entry = self.getDataEntry(user0EntryIdx)
-        # sort encounters by time stamp - using this method, some might be out of order
-        # self.sortEncounterTimes()
-        self.sortEncountersCompletely()
-
-
-    # Void - Sort the object's encounter list based only on unixtime stamps
+            self.sortEncounterTimeRuns()           #  consistency with multiple identical time stamps
+
+
+    # List - Return a precomputed integer sort key for the user pair of each encounter,
+    #        indexed like the encounter columns.  The key is rank1 * userCount + rank2, from
+    #        the alphabetical name ranks of the two users, so comparing keys orders the
+    #        encounters by username1, then by username2, without any string comparisons.
+    def encounterPairKeys(self):
+        userIds = self.userIds
+        ranks = self.userNameRanks
+        userCount = len(self.userList)
+        return [(ranks[userIds[row1]] * userCount) + ranks[userIds[row2]]
+                for (row1, row2) in zip(self.encounterRows1, self.encounterRows2)]
+
+    # Void - Sort the object's encounters based only on unixtime stamps
     def sortEncounterTimes(self):
-        sortedEncounters = sorted(self.encounterList, key=lambda enc: enc.time)
-        self.encounterList = sortedEncounters
+        self.encounterOrder = sorted(range(len(self.encounterTimes)),
+                                     key=self.encounterTimes.__getitem__)
 
-    # Void - Sort the object's encounter list by unixtime, then by username1, then by username2
+    # Void - Sort the object's encounters by unixtime, then by username1, then by username2
     #        This will make output consistent for encounters of different user pairs with the
     #        same unixtime values.
+    #        The three keys are folded into one precomputed integer per encounter (the pair
+    #        key is always less than userCount^2), so a single sort compares plain integers.
     def sortEncountersCompletely(self):
-        sortedEncounters = sorted(self.encounterList, key=operator.attrgetter('time', 'username1', 'username2'))
-        self.encounterList = sortedEncounters
-
-    # Void - Ask all encounters to print themselves to stdout.
+        pairKeyCount = len(self.userList) * len(self.userList)
+        keys = [(time * pairKeyCount) + pairKey
+                for (time, pairKey) in zip(self.encounterTimes, self.encounterPairKeys())]
+        self.encounterOrder = sorted(range(len(keys)), key=keys.__getitem__)
+
+    # Void - Sort each run of encounters with the same unixtime by username1, then by username2.
+    #        The encounter columns must already be in unixtime order, which they are after
+    #        findEncounters():  every encounter takes the time of the entry that caused it,
+    #        and the entries are in time order.  The result matches sortEncountersCompletely(),
+    #        but only the (usually tiny) runs are sorted instead of the whole list.
+    def sortEncounterTimeRuns(self):
+        times = self.encounterTimes
+        count = len(times)
+        order = list(range(count))
+        pairKeys = None
+        runStart = 0
+        while(runStart < count):
+            runTime = times[runStart]
+            runEnd = runStart + 1
+            while((runEnd < count) and (times[runEnd] == runTime)):
+                runEnd += 1
+            if((runEnd - runStart) > 1):
+                if(pairKeys == None):              # only build the pair keys if needed
+                    pairKeys = self.encounterPairKeys()
+                order[runStart:runEnd] = sorted(order[runStart:runEnd], key=pairKeys.__getitem__)
+            runStart = runEnd
+        self.encounterOrder = order
+
+    # Void - Write all the valid encounters to stdout at once, one line each, in a
+    #        specific single-line format, and in the sorted order if there is one.
+    #        The script runs with unbuffered output (-u), so all the lines are formatted
+    #        from the columns and joined into a single write.
+    #   <unixtime_integer>|<first_alphabetical_username>|<signed_decimal_string>|<signed_decimal_string>|<second_alphabetical_username>|<signed_decimal_string>|<signed_decimal_string>
+    #   Example:  1327418725|danny|37.77695245908|-122.39847741481|unclejoey|37.777335807234|-122.39812024905
     def printEncounters(self):
-        for encounter in self.encounterList:
-            encounter.printSelf()
+        order = self.encounterOrder
+        if(order == None):
+            order = range(len(self.encounterTimes))
+        times = self.encounterTimes
+        rows1 = self.encounterRows1
+        rows2 = self.encounterRows2
+        usernames = self.usernames
+        latS = self.latS
+        longS = self.longS
+        lineFormat = kHl_EncounterOutputFormat
+        lines = []
+        for i in order:
+            row1 = rows1[i]
+            row2 = rows2[i]
+            lines.append(lineFormat % (times[i], usernames[row1], latS[row1], longS[row1],
+                                       usernames[row2], latS[row2], longS[row2]))
+        if(lines):
+            sys.stdout.write('\n'.join(lines) + '\n')
 
 
 
@@ -776,64 +1054,65 @@ def printUsage(doExit):
         scriptName = sys.argv[0]
     else:
         scriptName = 'Script'
-    print scriptName + ' usage:  ' + scriptName + ' [-[a|b|d|h|p|s]] [input_file]'
-    print '  If called without an input_file argument, the script will look for a file named userdata.txt.'
-    print '  Other optional arguments can be combined, can appear before or after the input file, and include:'
-    print '    -a:  enable filtering of distance calculations based on chord approximations'
-    print '    -b:  use the brute force method of processing the data entries; adds final sort'
-    print '    -d:  enable printing of extra debugging information'
-    print '    -h:  print this help information and exit'
-    print '    -p:  skip printing encounters (used for profiling)'
-    print '    -s:  optionally sort final encounter list for consistent ordering of names with same unixtime'
-    print '         (brute force method automatically includes the final sort)'
-    print
+    print(scriptName + ' usage:  ' + scriptName + ' [-[a|b|d|e|h|p|s]] [input_file]')
+    print('  If called without an input_file argument, the script will look for a file named userdata.txt.')
+    print('  Other optional arguments can be combined, can appear before or after the input file, and include:')
+    print('    -a:  enable filtering of distance calculations based on equirectangular approximations')
+    print('         (enabled by default)')
+    print('    -b:  use the brute force method of processing the data entries; adds final sort')
+    print('    -d:  enable printing of extra debugging information')
+    print('    -e:  use only the exact Haversine formula; disables the approximation filter')
+    print('    -h:  print this help information and exit')
+    print('    -p:  skip printing encounters (used for profiling)')
+    print('    -s:  optionally sort final encounter list for consistent ordering of names with same unixtime')
+    print('         (brute force method automatically includes the final sort)')
+    print()
     if(doExit):
         exit(1)
 
 
+# Option characters mapped to the global option flag each one sets, and its new value.
+# The help option (h) is handled separately, since it prints the usage and exits.
+kHl_OptionSettings = {
+    'a': ('use_approx_dist_filter', True),
+    'b': ('use_brute_force_method', True),
+    'd': ('do_debug', True),
+    'e': ('use_approx_dist_filter', False),
+    'p': ('skip_printing_for_profiling', True),
+    's': ('sort_encounter_list', True),
+}
+
 # String - This function parses the supplied arguments and returns the file name in a string.
 #          If no bare file name has been provided, it assumes the file is userdata.txt.
 #          If an optional argument is incorrect or requests help, then the function will
 #          print the script usage and exit.  If more one string is supplied without a
 #          leading dash, the function will also print the script usage and exit.
 #          It is flexible enough to support combined optional arguments (like '-ds').
+#          Each option character is looked up in the kHl_OptionSettings table, and the
+#          global flag it names is set in the module's globals.
 def parseArguments():
-    global do_debug, use_approx_dist_filter, use_brute_force_method, skip_printing_for_profiling
-    global sort_encounter_list
     fileArgument = None
-    argLength = len(sys.argv)
-    if(argLength > 1):
-        for currentArgument in range(1, argLength):
-            argString = sys.argv[currentArgument]
-            argStringLength = len(argString)
-            if(argStringLength > 0):
-                if(argString[0] == '-'):
-                    if(argStringLength == 1):
-                        printUsage(True)
-                    currentCharIndex = 1
-                    while(currentCharIndex < argStringLength):
-                        if(argString[currentCharIndex] == 'h'):
-                            printUsage(True)
-                    
-                        if(argString[currentCharIndex] == 'd'):
-                            do_debug = True
-                        elif(argString[currentCharIndex] == 'a'):
-                            use_approx_dist_filter = True
-                        elif(argString[currentCharIndex] == 'b'):
-                            use_brute_force_method = True
-                        elif(argString[currentCharIndex] == 'p'):
-                            skip_printing_for_profiling = True
-                        elif(argString[currentCharIndex] == 's'):
-                            sort_encounter_list = True
-                        else:
-                            print '"' + argString[currentCharIndex] + '" is not a valid option.'
-                            printUsage(True)
-                        currentCharIndex += 1
-                else:
-                    if(fileArgument != None):   # quit if we've already seen a bare file name
-                        print 'Please pass the script a maximum of one input file name.'
-                        printUsage(True)
-                    fileArgument = argString    # otherwise, use it as the input file
+    moduleGlobals = globals()
+    for argString in sys.argv[1:]:
+        if(len(argString) == 0):
+            continue
+        if(argString[0] == '-'):
+            if(len(argString) == 1):
+                printUsage(True)
+            for optionChar in argString[1:]:
+                if(optionChar == 'h'):
+                    printUsage(True)
+                setting = kHl_OptionSettings.get(optionChar)
+                if(setting == None):
+                    print('"' + optionChar + '" is not a valid option.')
+                    printUsage(True)
+                (flagName, flagValue) = setting
+                moduleGlobals[flagName] = flagValue
+        else:
+            if(fileArgument != None):   # quit if we've already seen a bare file name
+                print('Please pass the script a maximum of one input file name.')
+                printUsage(True)
+            fileArgument = argString    # otherwise, use it as the input file
     if(fileArgument == None):           # use the problem's initial input file as default
         fileArgument = "userdata.txt"
     return fileArgument
@@ -848,14 +1127,15 @@ fileArgument = parseArguments()   # set options and get input file name
 
 # If debugging, print out the options
 if(do_debug):
-    print "Running with do_debug %d, use_approx_dist_filter %d, use_brute_force_method %d, skip_printing_for_profiling %d, sort_encounter_list %d" % (do_debug, use_approx_dist_filter, use_brute_force_method,
-                                                                                                                                                      skip_printing_for_profiling, sort_encounter_list)
+    print("Running with do_debug %d, use_approx_dist_filter %d, use_brute_force_method %d, skip_printing_for_profiling %d, sort_encounter_list %d" % (do_debug, use_approx_dist_filter, use_brute_force_method,
+                                                                                                                                                       skip_printing_for_profiling, sort_encounter_list))
 
 # Create a processor and read the input file
 processor = HlProcessor(fileArgument, use_approx_dist_filter, sort_encounter_list)
 
 if(use_brute_force_method):                  # call the obsolete method if desired
-    processor.findEncountersBruteForce()
+    from hl_enc_bruteforce import findEncountersBruteForce   # only loaded when needed
+    findEncountersBruteForce(processor)
 else:                                        # call the better one by default
     processor.findEncounters()
 